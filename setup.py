@@ -0,0 +1,27 @@
+"""Compilación opcional de los módulos críticos con Cython.
+
+Uso: python setup.py build_ext --inplace
+
+Si Cython no está instalado o la extensión no se compila, Python importa el
+módulo .py normalmente.
+"""
+
+from setuptools import setup, Extension
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize(
+        [Extension("utils.mod_xml", ["utils/mod_xml.py"])],
+        compiler_directives={"language_level": 3},
+    )
+
+setup(
+    name="gestor_facturas",
+    python_requires=">=3.10",
+    install_requires=["lxml", "ciso8601"],
+    extras_require={"df": ["pandas"]},
+    ext_modules=ext_modules,
+)
@@ -0,0 +1,30 @@
+"""Pruebas del parser de CFDIs."""
+
+import pytest
+
+pytest.importorskip("lxml")
+pytest.importorskip("ciso8601")
+
+from utils.mod_xml import parsear_cfdi
+
+CFDI_SIN_TIMBRE_CON_PI = """<?xml version="1.0" encoding="UTF-8"?>
+<?xml-stylesheet type="text/xsl" href="cfdi.xsl"?>
+<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" Version="4.0" Folio="5" Total="10.00" Fecha="2024-01-01T00:00:00">
+  <cfdi:Emisor Rfc="AAA010101AAA" Nombre="Emisor"/>
+  <cfdi:Receptor Rfc="BBB010101BBB" Nombre="Receptor"/>
+</cfdi:Comprobante>
+"""
+
+def test_cfdi_sin_timbre_con_instruccion_de_procesamiento(tmp_path):
+    """Un CFDI sin TimbreFiscalDigital y con una PI antes de la raíz se parsea sin error."""
+    archivo = tmp_path / "factura.xml"
+    archivo.write_text(CFDI_SIN_TIMBRE_CON_PI, encoding="utf-8")
+    
+    cfdi = parsear_cfdi(archivo)
+    
+    assert cfdi is not None
+    assert cfdi.folio == "5"
+    assert cfdi.total == 10.0
+    assert cfdi.emisor_rfc == "AAA010101AAA"
+    assert cfdi.receptor_rfc == "BBB010101BBB"
+    assert cfdi.uuid is None
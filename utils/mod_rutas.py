@@ -1,5 +1,6 @@
 #Módulo para gestionar de manera segura los directorios y rutas
 
+import os
 from pathlib import Path
 
 # Obtener rutas de directorios estructurales del proyecto
@@ -12,15 +13,24 @@ DIR_SRC = DIR_BASE / "src"
 DIR_PENDIENTES = DIR_BASE / "data" / "facturas_pendientes"
 DIR_PROCESADAS = DIR_BASE / "data" / "facturas_procesadas"
 
+# Indica si los directorios ya se crearon en este proceso
+_INITIALIZED = False
+
 def init_directorios():
     """Inicializa los directorios no estructurales"""
+    global _INITIALIZED
+    if _INITIALIZED:
+        return
+
     directorios = [
         DIR_PROCESADAS,
         DIR_PENDIENTES,
     ]
 
     for directorio in directorios:
-        directorio.mkdir(parents=True,exist_ok=True)
+        os.makedirs(directorio, exist_ok=True)
+
+    _INITIALIZED = True
 
 
 
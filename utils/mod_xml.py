@@ -1,13 +1,19 @@
 """Módulo para la gestión y parseo de archivos XML de CFDIs (SAT México)."""
 
-import xml.etree.ElementTree as ET
-from pathlib import Path
+import os
+import ciso8601
+from lxml import etree as ET
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, Iterator, Union
 from .mod_rutas import DIR_PENDIENTES, DIR_PROCESADAS
 
-# Namespaces oficiales del SAT para CFDIs
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Namespaces oficiales del SAT para CFDIs. El parser compara tags en notación
+# Clark y no usa este mapa; se conserva para otros módulos que lo importen.
 CFDI_NAMESPACES = {
     'cfdi': 'http://www.sat.gob.mx/cfd/4',
     'cfdi3': 'http://www.sat.gob.mx/cfd/3',
@@ -15,7 +21,26 @@ CFDI_NAMESPACES = {
     'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
 }
 
-@dataclass
+# Tags en notación Clark, para comparar sin resolver prefijos en cada llamada
+TAG_EMISOR_V4 = "{http://www.sat.gob.mx/cfd/4}Emisor"
+TAG_RECEPTOR_V4 = "{http://www.sat.gob.mx/cfd/4}Receptor"
+TAG_EMISOR_V3 = "{http://www.sat.gob.mx/cfd/3}Emisor"
+TAG_RECEPTOR_V3 = "{http://www.sat.gob.mx/cfd/3}Receptor"
+TAG_TFD = "{http://www.sat.gob.mx/TimbreFiscalDigital}TimbreFiscalDigital"
+
+# Nombres de atributos en CFDIs 3.x: 3.3 usa PascalCase y 3.2 minúsculas
+CLAVES_COMPROBANTE_V3_PASCAL = ('Folio', 'Serie', 'Total', 'SubTotal', 'Fecha')
+CLAVES_COMPROBANTE_V3_MINUSCULAS = ('folio', 'serie', 'total', 'subTotal', 'fecha')
+CLAVES_PERSONA_V3_PASCAL = ('Rfc', 'Nombre')
+CLAVES_PERSONA_V3_MINUSCULAS = ('rfc', 'nombre')
+
+# Máximo de archivos enviados a cada proceso por lote, para amortizar el costo de IPC
+CHUNKSIZE_PROCESOS = 16
+
+# Por debajo de este número de archivos no compensa arrancar el pool de procesos
+MIN_ARCHIVOS_PARALELO = 32
+
+@dataclass(slots=True)
 class CFDIData:
     """Clase para almacenar los datos extraídos de un CFDI."""
     folio: Optional[str] = None
@@ -48,38 +73,52 @@ class CFDIData:
 class CFDIParser:
     """Parser para archivos XML de CFDIs del SAT."""
     
-    def __init__(self):
-        self.namespaces = CFDI_NAMESPACES
+    # Opciones de libxml2 para el parseo incremental
+    _opciones_parser = {
+        'huge_tree': False,
+        'remove_blank_text': True,
+        'remove_comments': True,
+    }
     
-    def parsear_archivo(self, ruta_archivo: Path) -> Optional[CFDIData]:
+    def parsear_archivo(self, ruta_archivo: Union[str, os.PathLike]) -> Optional[CFDIData]:
         """
         Parsea un archivo XML de CFDI y extrae los datos principales.
         
+        El archivo se recorre de manera incremental: los nodos ya cerrados
+        (Conceptos, Impuestos, etc.) se liberan y la lectura se detiene al
+        encontrar el TimbreFiscalDigital.
+        
         Args:
-            ruta_archivo (Path): Ruta al archivo XML del CFDI
+            ruta_archivo (str | os.PathLike): Ruta al archivo XML del CFDI
             
         Returns:
             CFDIData: Objeto con los datos extraídos o None si hay error
         """
+        # Se convierte la ruta a str una sola vez para open() y los mensajes
+        ruta = os.fspath(ruta_archivo)
+        
         try:
-            if not ruta_archivo.exists():
-                raise FileNotFoundError(f"Archivo no encontrado: {ruta_archivo}")
-            
-            tree = ET.parse(ruta_archivo)
-            root = tree.getroot()
+            nombre_archivo = os.path.basename(ruta)
             
-            # Detectar versión del CFDI
-            version = self._detectar_version(root)
-            
-            if version == "4.0":
-                return self._parsear_cfdi_v4(root, ruta_archivo)
-            elif version == "3.3":
-                return self._parsear_cfdi_v3(root, ruta_archivo)
-            else:
-                raise ValueError(f"Versión de CFDI no soportada: {version}")
+            # open() lanza FileNotFoundError si el archivo no existe
+            with open(ruta, 'rb') as archivo:
+                contexto = ET.iterparse(archivo, events=("start", "end"), **self._opciones_parser)
+                
+                # El primer evento corresponde al nodo Comprobante
+                _, root = next(contexto)
+                
+                # Detectar versión del CFDI
+                version = self._detectar_version(root)
                 
-        except Exception as e:
-            print(f"Error al parsear CFDI {ruta_archivo}: {e}")
+                if version == "4.0":
+                    return self._parsear_cfdi_v4(root, contexto, nombre_archivo)
+                elif version == "3.3":
+                    return self._parsear_cfdi_v3(root, contexto, nombre_archivo)
+                else:
+                    raise ValueError(f"Versión de CFDI no soportada: {version}")
+                
+        except (OSError, ET.ParseError, ValueError) as e:
+            print(f"Error al parsear CFDI {ruta}: {e}")
             return None
     
     def _detectar_version(self, root) -> str:
@@ -92,85 +131,161 @@ class CFDIParser:
             # Fallback: buscar en el atributo version
             return root.get('Version', '3.3')
     
-    def _parsear_cfdi_v4(self, root, archivo: Path) -> CFDIData:
+    def _parsear_cfdi_v4(self, root, contexto, nombre_archivo: str) -> CFDIData:
         """Parsea un CFDI versión 4.0."""
-        cfdi = CFDIData()
-        cfdi.version = "4.0"
-        cfdi.archivo_origen = str(archivo.name)
-        
         # Datos del comprobante
-        cfdi.folio = root.get('Folio')
-        cfdi.serie = root.get('Serie')
-        cfdi.total = self._convertir_a_float(root.get('Total'))
-        cfdi.subtotal = self._convertir_a_float(root.get('SubTotal'))
-        cfdi.moneda = root.get('Moneda', 'MXN')
-        cfdi.fecha_emision = self._convertir_fecha(root.get('Fecha'))
-        
-        # Datos del emisor
-        emisor = root.find('cfdi:Emisor', self.namespaces)
-        if emisor is not None:
-            cfdi.emisor_rfc = emisor.get('Rfc')
-            cfdi.emisor_nombre = emisor.get('Nombre')
-            cfdi.emisor_regimen = emisor.get('RegimenFiscal')
-        
-        # Datos del receptor
-        receptor = root.find('cfdi:Receptor', self.namespaces)
-        if receptor is not None:
-            cfdi.receptor_rfc = receptor.get('Rfc')
-            cfdi.receptor_nombre = receptor.get('Nombre')
-        
-        # Datos del timbre fiscal
-        self._extraer_timbre_fiscal(root, cfdi)
-        
-        return cfdi
-    
-    def _parsear_cfdi_v3(self, root, archivo: Path) -> CFDIData:
-        """Parsea un CFDI versión 3.3."""
-        cfdi = CFDIData()
-        cfdi.version = "3.3"
-        cfdi.archivo_origen = str(archivo.name)
+        attrs = root.attrib
+        total = attrs.get('Total')
+        subtotal = attrs.get('SubTotal')
+        folio = attrs.get('Folio')
+        serie = attrs.get('Serie')
+        moneda = attrs.get('Moneda', 'MXN')
+        fecha_emision = self._convertir_fecha(attrs.get('Fecha'))
         
-        # Usar namespace v3 para elementos
-        ns = {'cfdi': 'http://www.sat.gob.mx/cfd/3'}
+        emisor_rfc = emisor_nombre = emisor_regimen = None
+        receptor_rfc = receptor_nombre = None
+        uuid = fecha_timbrado = None
         
+        for evento, elem in contexto:
+            # Los nodos cerrados ya no se necesitan
+            if evento == "end":
+                self._liberar_elemento(elem)
+                continue
+            
+            tag = elem.tag
+            
+            # Datos del emisor
+            if tag == TAG_EMISOR_V4:
+                attrs = elem.attrib
+                emisor_rfc = attrs.get('Rfc')
+                emisor_nombre = attrs.get('Nombre')
+                emisor_regimen = attrs.get('RegimenFiscal')
+            
+            # Datos del receptor
+            elif tag == TAG_RECEPTOR_V4:
+                attrs = elem.attrib
+                receptor_rfc = attrs.get('Rfc')
+                receptor_nombre = attrs.get('Nombre')
+            
+            # Datos del timbre fiscal; no se necesita leer más
+            elif tag == TAG_TFD:
+                uuid, fecha_timbrado = self._extraer_timbre_fiscal(elem)
+                break
+        
+        return CFDIData(
+            folio=folio,
+            serie=serie,
+            fecha_emision=fecha_emision,
+            total=float(total) if total else None,
+            subtotal=float(subtotal) if subtotal else None,
+            moneda=moneda,
+            emisor_rfc=emisor_rfc,
+            emisor_nombre=emisor_nombre,
+            emisor_regimen=emisor_regimen,
+            receptor_rfc=receptor_rfc,
+            receptor_nombre=receptor_nombre,
+            uuid=uuid,
+            fecha_timbrado=fecha_timbrado,
+            version="4.0",
+            archivo_origen=nombre_archivo,
+        )
+    
+    def _parsear_cfdi_v3(self, root, contexto, nombre_archivo: str) -> CFDIData:
+        """Parsea un CFDI versión 3.3."""
         # Datos del comprobante
-        cfdi.folio = root.get('folio') or root.get('Folio')
-        cfdi.serie = root.get('serie') or root.get('Serie')
-        cfdi.total = self._convertir_a_float(root.get('total') or root.get('Total'))
-        cfdi.subtotal = self._convertir_a_float(root.get('subTotal') or root.get('SubTotal'))
-        cfdi.moneda = root.get('Moneda', 'MXN')
-        cfdi.fecha_emision = self._convertir_fecha(root.get('fecha') or root.get('Fecha'))
-        
-        # Datos del emisor
-        emisor = root.find('cfdi:Emisor', ns)
-        if emisor is not None:
-            cfdi.emisor_rfc = emisor.get('rfc') or emisor.get('Rfc')
-            cfdi.emisor_nombre = emisor.get('nombre') or emisor.get('Nombre')
-        
-        # Datos del receptor
-        receptor = root.find('cfdi:Receptor', ns)
-        if receptor is not None:
-            cfdi.receptor_rfc = receptor.get('rfc') or receptor.get('Rfc')
-            cfdi.receptor_nombre = receptor.get('nombre') or receptor.get('Nombre')
-        
-        # Datos del timbre fiscal
-        self._extraer_timbre_fiscal(root, cfdi)
-        
-        return cfdi
-    
-    def _extraer_timbre_fiscal(self, root, cfdi: CFDIData):
-        """Extrae datos del timbre fiscal digital."""
-        # Buscar el complemento de timbre fiscal
-        complemento = root.find('.//tfd:TimbreFiscalDigital', self.namespaces)
-        if complemento is not None:
-            cfdi.uuid = complemento.get('UUID')
-            cfdi.fecha_timbrado = self._convertir_fecha(complemento.get('FechaTimbrado'))
-    
-    def _convertir_fecha(self, fecha_str: str) -> Optional[datetime]:
+        attrs = root.attrib
+        
+        # Un CFDI usa la misma convención de nombres en todo el documento
+        if 'Folio' in attrs or 'Total' in attrs:
+            folio_k, serie_k, total_k, subtotal_k, fecha_k = CLAVES_COMPROBANTE_V3_PASCAL
+            rfc_k, nombre_k = CLAVES_PERSONA_V3_PASCAL
+        else:
+            folio_k, serie_k, total_k, subtotal_k, fecha_k = CLAVES_COMPROBANTE_V3_MINUSCULAS
+            rfc_k, nombre_k = CLAVES_PERSONA_V3_MINUSCULAS
+        
+        total = attrs.get(total_k)
+        subtotal = attrs.get(subtotal_k)
+        folio = attrs.get(folio_k)
+        serie = attrs.get(serie_k)
+        moneda = attrs.get('Moneda', 'MXN')
+        fecha_emision = self._convertir_fecha(attrs.get(fecha_k))
+        
+        emisor_rfc = emisor_nombre = None
+        receptor_rfc = receptor_nombre = None
+        uuid = fecha_timbrado = None
+        
+        for evento, elem in contexto:
+            # Los nodos cerrados ya no se necesitan
+            if evento == "end":
+                self._liberar_elemento(elem)
+                continue
+            
+            tag = elem.tag
+            
+            # Datos del emisor
+            if tag == TAG_EMISOR_V3:
+                attrs = elem.attrib
+                emisor_rfc = attrs.get(rfc_k)
+                emisor_nombre = attrs.get(nombre_k)
+            
+            # Datos del receptor
+            elif tag == TAG_RECEPTOR_V3:
+                attrs = elem.attrib
+                receptor_rfc = attrs.get(rfc_k)
+                receptor_nombre = attrs.get(nombre_k)
+            
+            # Datos del timbre fiscal; no se necesita leer más
+            elif tag == TAG_TFD:
+                uuid, fecha_timbrado = self._extraer_timbre_fiscal(elem)
+                break
+        
+        return CFDIData(
+            folio=folio,
+            serie=serie,
+            fecha_emision=fecha_emision,
+            total=float(total) if total else None,
+            subtotal=float(subtotal) if subtotal else None,
+            moneda=moneda,
+            emisor_rfc=emisor_rfc,
+            emisor_nombre=emisor_nombre,
+            receptor_rfc=receptor_rfc,
+            receptor_nombre=receptor_nombre,
+            uuid=uuid,
+            fecha_timbrado=fecha_timbrado,
+            version="3.3",
+            archivo_origen=nombre_archivo,
+        )
+    
+    def _extraer_timbre_fiscal(self, timbre) -> tuple[Optional[str], Optional[datetime]]:
+        """Extrae UUID y fecha de timbrado del timbre fiscal digital."""
+        attrs = timbre.attrib
+        uuid = attrs.get('UUID')
+        fecha_timbrado = self._convertir_fecha(attrs.get('FechaTimbrado'))
+        return uuid, fecha_timbrado
+    
+    def _liberar_elemento(self, elem):
+        """Libera un nodo ya cerrado y los hermanos anteriores que siguen en el árbol."""
+        elem.clear()
+        
+        # El nodo raíz no tiene padre; sus hermanos son PIs o comentarios
+        parent = elem.getparent()
+        if parent is None:
+            return
+        while elem.getprevious() is not None:
+            del parent[0]
+    
+    def _convertir_fecha(self, fecha_str: Optional[str]) -> Optional[datetime]:
         """Convierte string de fecha a objeto datetime."""
         if not fecha_str:
             return None
         
+        # Ruta rápida: los CFDIs usan ISO 8601 (ciso8601 acepta 'T' o espacio).
+        # Se descarta un posible offset para devolver siempre fechas naive.
+        try:
+            return ciso8601.parse_datetime_as_naive(fecha_str)
+        except ValueError:
+            pass
+        
         # Formatos comunes de fecha en CFDIs
         formatos = [
             '%Y-%m-%dT%H:%M:%S',
@@ -187,29 +302,60 @@ class CFDIParser:
         
         print(f"No se pudo convertir la fecha: {fecha_str}")
         return None
-    
-    def _convertir_a_float(self, valor: str) -> Optional[float]:
-        """Convierte string a float de manera segura."""
-        if not valor:
-            return None
-        try:
-            return float(valor)
-        except ValueError:
-            return None
+
+# Instancia compartida por las funciones de utilidad
+_PARSER_SINGLETON = CFDIParser()
+
+def _inicializar_proceso():
+    """Crea la instancia compartida del parser en cada proceso del pool."""
+    global _PARSER_SINGLETON
+    _PARSER_SINGLETON = CFDIParser()
 
 # Funciones de utilidad para usar desde otros módulos
-def parsear_cfdi(archivo_path: Path) -> Optional[CFDIData]:
+def parsear_cfdi(archivo_path: Union[str, os.PathLike]) -> Optional[CFDIData]:
     """
     Función de conveniencia para parsear un CFDI.
     
     Args:
-        archivo_path (Path): Ruta al archivo XML del CFDI
+        archivo_path (str | os.PathLike): Ruta al archivo XML del CFDI
         
     Returns:
         CFDIData: Datos extraídos del CFDI o None si hay error
     """
-    parser = CFDIParser()
-    return parser.parsear_archivo(archivo_path)
+    return _PARSER_SINGLETON.parsear_archivo(archivo_path)
+
+def _iterar_cfdis_pendientes() -> Iterator[CFDIData]:
+    """Parsea en paralelo los XML del directorio de pendientes y genera los CFDIs válidos."""
+    if not DIR_PENDIENTES.exists():
+        return
+    
+    # scandir da el tipo de cada entrada sin un stat() adicional por archivo
+    with os.scandir(DIR_PENDIENTES) as entradas:
+        archivos = [
+            entrada.path for entrada in entradas
+            if entrada.name.lower().endswith('.xml') and entrada.is_file(follow_symlinks=False)
+        ]
+    if not archivos:
+        return
+    
+    num_archivos = len(archivos)
+    max_workers = min(os.cpu_count() or 1, num_archivos)
+    
+    # En lotes chicos el arranque de los procesos cuesta más que el parseo
+    if num_archivos < MIN_ARCHIVOS_PARALELO or max_workers == 1:
+        for archivo in archivos:
+            cfdi_data = parsear_cfdi(archivo)
+            if cfdi_data:
+                yield cfdi_data
+        return
+    
+    # El parseo es independiente por archivo, se reparte entre procesos.
+    # Se busca ~4 lotes por proceso para balancear la carga entre ellos.
+    chunksize = max(1, min(CHUNKSIZE_PROCESOS, num_archivos // (max_workers * 4)))
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_inicializar_proceso) as executor:
+        for cfdi_data in executor.map(parsear_cfdi, archivos, chunksize=chunksize):
+            if cfdi_data:
+                yield cfdi_data
 
 def procesar_cfdis_pendientes() -> list[CFDIData]:
     """
@@ -218,13 +364,44 @@ def procesar_cfdis_pendientes() -> list[CFDIData]:
     Returns:
         list[CFDIData]: Lista con los datos de todos los CFDIs procesados
     """
-    cfdis = []
-    if DIR_PENDIENTES.exists():
-        for archivo in DIR_PENDIENTES.glob("*.xml"):
-            cfdi_data = parsear_cfdi(archivo)
-            if cfdi_data:
-                cfdis.append(cfdi_data)
-    return cfdis
+    return list(_iterar_cfdis_pendientes())
+
+def procesar_cfdis_pendientes_df() -> "pd.DataFrame":
+    """
+    Procesa todos los archivos XML en el directorio de pendientes en formato columnar.
+    
+    Las columnas se llenan durante el parseo, sin conservar los objetos CFDIData,
+    para agregar (sumas por emisor, agrupación por mes, etc.) con pandas.
+    
+    Returns:
+        pandas.DataFrame: Una fila por CFDI con las columnas folio, serie, uuid,
+        fecha_emision, total, moneda, emisor_rfc y receptor_rfc
+    """
+    import pandas as pd
+    
+    folios, series, uuids, fechas = [], [], [], []
+    totales, monedas, emisor_rfcs, receptor_rfcs = [], [], [], []
+    
+    for cfdi_data in _iterar_cfdis_pendientes():
+        folios.append(cfdi_data.folio)
+        series.append(cfdi_data.serie)
+        uuids.append(cfdi_data.uuid)
+        fechas.append(cfdi_data.fecha_emision)
+        totales.append(cfdi_data.total)
+        monedas.append(cfdi_data.moneda)
+        emisor_rfcs.append(cfdi_data.emisor_rfc)
+        receptor_rfcs.append(cfdi_data.receptor_rfc)
+    
+    return pd.DataFrame({
+        'folio': pd.Series(folios, dtype='object'),
+        'serie': pd.Series(series, dtype='object'),
+        'uuid': pd.Series(uuids, dtype='object'),
+        'fecha_emision': pd.to_datetime(pd.Series(fechas, dtype='object')).astype('datetime64[ns]'),
+        'total': pd.Series(totales, dtype='float64'),
+        'moneda': pd.Series(monedas, dtype='category'),
+        'emisor_rfc': pd.Series(emisor_rfcs, dtype='category'),
+        'receptor_rfc': pd.Series(receptor_rfcs, dtype='category'),
+    })
 
 def obtener_resumen_cfdi(cfdi_data: CFDIData) -> Dict[str, Any]:
     """
@@ -236,9 +413,13 @@ def obtener_resumen_cfdi(cfdi_data: CFDIData) -> Dict[str, Any]:
     Returns:
         dict: Resumen con los datos principales
     """
+    # Formato dd/mm/aaaa sin pasar por strftime
+    fecha = cfdi_data.fecha_emision
+    fecha_str = f"{fecha.day:02d}/{fecha.month:02d}/{fecha.year:04d}" if fecha else None
+    
     return {
         'folio_completo': f"{cfdi_data.serie}-{cfdi_data.folio}" if cfdi_data.serie else cfdi_data.folio,
-        'fecha_emision': cfdi_data.fecha_emision.strftime('%d/%m/%Y') if cfdi_data.fecha_emision else None,
+        'fecha_emision': fecha_str,
         'emisor': cfdi_data.emisor_nombre or cfdi_data.emisor_rfc,
         'receptor': cfdi_data.receptor_nombre or cfdi_data.receptor_rfc,
         'total': f"${cfdi_data.total:,.2f} {cfdi_data.moneda}" if cfdi_data.total else None,